@@ -1,26 +1,156 @@
-''' Implements a multi-threaded wrapper to OpenCV's VideoCapture, that behaves like a 
-List and/or Generator Object. Should be compatible with all applicable OpenCV versions.
+''' Implements a multi-threaded wrapper to OpenCV's VideoCapture, that behaves like a
+List and/or Generator Object. Requires OpenCV >= 3.0 (OpenCV 2 is end-of-life).
 
 Supports video files and video streams (webcam, http stream, etc.)
 '''
 
 import cv2
+import numpy as np
+import os
+import subprocess
 import threading
+import time
 import queue
-import inspect
+from multiprocessing import shared_memory
+
+_CAP_PROP_POS_FRAMES = cv2.CAP_PROP_POS_FRAMES
+
+#capture properties read at construction: (attribute name, cv2 property, cast)
+_CAP_PROPS = (('fps', cv2.CAP_PROP_FPS, float),
+              ('frame_count', cv2.CAP_PROP_FRAME_COUNT, int),
+              ('video_codec', cv2.CAP_PROP_FOURCC, int),
+              ('height', cv2.CAP_PROP_FRAME_HEIGHT, int),
+              ('width', cv2.CAP_PROP_FRAME_WIDTH, int))
+
+#user friendly names for the cv2.VIDEO_ACCELERATION_* enums introduced in OpenCV 4.5.2
+HW_ACCELERATION_TYPES = {'any': 'VIDEO_ACCELERATION_ANY',
+                         'd3d11': 'VIDEO_ACCELERATION_D3D11',
+                         'vaapi': 'VIDEO_ACCELERATION_VAAPI',
+                         'mfx': 'VIDEO_ACCELERATION_MFX',
+                         'none': 'VIDEO_ACCELERATION_NONE'}
+
+class _SPSCRingBuffer():
+    ''' Single-producer / single-consumer ring buffer, used in place of queue.Queue for the
+    background thread -> main thread frame handoff. queue.Queue takes a Lock plus a Condition variable
+    (and unfinished_tasks bookkeeping) on every put() and get(); here each operation is one semaphore
+    acquire and one release - a pair of atomic counter ops that only hit the kernel when a side
+    actually has to block. The slots semaphore counts free capacity and gates the producer, the items
+    semaphore counts queued entries and gates the consumer.
+
+    Storage is rounded up to a power of two so index wrapping is a bitwise AND instead of a modulo,
+    but the slots semaphore enforces the requested maxsize, so the buffer never holds more entries
+    than asked for. Head and tail are separate attributes written by only one thread each, which the
+    GIL makes safe without a lock. Raises queue.Full / queue.Empty like queue.Queue. NOT safe with
+    multiple producers or multiple consumers.
+    '''
+
+    def __init__(self, maxsize):
+        capacity = 1
+        while capacity < maxsize:
+            capacity *= 2
+
+        self.maxsize = maxsize
+        self.capacity = capacity
+        self._mask = capacity - 1
+        self._buffer = [None] * capacity
+        self._head = 0 #next slot to read - only ever written by the consumer
+        self._tail = 0 #next slot to write - only ever written by the producer
+        self._slots = threading.Semaphore(maxsize) #free capacity remaining - maxsize, not the rounded-up storage size
+        self._items = threading.Semaphore(0) #entries ready to consume
+
+    def put(self, item, block = True, timeout = None):
+        if not self._slots.acquire(blocking = block, timeout = timeout):
+            raise queue.Full
+
+        self._buffer[self._tail & self._mask] = item
+        self._tail += 1
+        self._items.release()
+
+    def put_nowait(self, item):
+        self.put(item, block = False)
+
+    def get(self, block = True, timeout = None):
+        if not self._items.acquire(blocking = block, timeout = timeout):
+            raise queue.Empty
+
+        slot = self._head & self._mask
+        item = self._buffer[slot]
+        self._buffer[slot] = None #drop the reference so the frame can be freed promptly
+        self._head += 1
+        self._slots.release()
+        return item
+
+    def get_nowait(self):
+        return self.get(block = False)
+
+    def empty(self):
+        return self._head == self._tail
+
+    def clear(self):
+        '''Drain the buffer. Only call when the producer thread is stopped.'''
+        while True:
+            try:
+                self.get_nowait()
+            except queue.Empty:
+                break
+
+class FrameHandle():
+    ''' Handle to one pooled frame buffer, yielded by VideoLoader.iter_frame_handles().
+    The buffer stays owned by the handle until release() is called (or the handle is used as a
+    context manager), at which point the slot goes back to the loader's free list for reuse.
+    For cross-process consumers, send handle.slot to the worker process (which maps the pool via
+    the loader's shared_memory_name) and release the handle once the worker is done - the frame
+    itself is never pickled or copied. Release handles from the thread that iterates the loader.
+    '''
+
+    def __init__(self, frame, slot, free_slots):
+        self.frame = frame
+        self.slot = slot #index of the frame's buffer in the owning VideoLoader's pool
+        self._free_slots = free_slots
+        self._released = False
+
+    def __enter__(self):
+        return self.frame
+
+    def __exit__(self, *args):
+        self.release()
+
+    def release(self):
+        '''Hand the pooled buffer back for reuse. The frame must not be touched afterwards.'''
+        if not self._released:
+            self._released = True
+            self._free_slots.put(self.slot)
 
 class VideoLoader():
     ''' Implements a wrapper to OpenCV's VideoCapture, that behaves like a Python Object.
-    Should be compatible with all applicable OpenCV versions. Support for threading to speed up
-    video read operations.
+    Requires OpenCV >= 3.0. Support for threading to speed up video read operations.
 
     Based on code here: https://github.com/WelkinU/ThreadedVideoLoader
     '''
 
+    #prebuilt __repr__ template - no per-print dedent/regex work like the old inspect.cleandoc approach
+    _REPR_TEMPLATE = ('-------------VideoLoader Object-------------\n'
+                      'Video Source: {video_path}\n'
+                      'Threaded: {use_threading}\n'
+                      'Image Transform: {image_transform}\n'
+                      'Height: {height}\n'
+                      'Width: {width}\n'
+                      'Length: {frame_count}\n'
+                      'FPS: {fps}\n'
+                      'Video Codec: {video_codec}\n'
+                      'Precached frames: {precache_frames}\n'
+                      'Slicing Returns Iterator (Default=List): {return_slices_as_iterator}\n'
+                      '--------------------------------------------')
+
     def __init__(self, video_path, use_threading = True, precache_frames = False, return_slices_as_iterator = False,
-                    max_queue_size = 20, image_transform = None, width = None, height = None):
+                    max_queue_size = 20, image_transform = None, width = None, height = None, hw_accel = 'any',
+                    use_cudacodec = False, use_buffer_pool = False, opencv_num_threads = None, batch_size = 8,
+                    backend = 'opencv', use_umat = False, producer_cpu = None, consumer_cpu = None,
+                    use_shared_memory = False):
         ''' Initialize Video Loader
         video_path {str} -- Filepath to the video (path/to/video.mp4). Alternatively, use 0 for webcam (or 1 for your second webcam).
+                            A GStreamer pipeline string (detected by a '!' in it, or an explicit 'gst:' prefix) is opened with
+                            cv2.CAP_GSTREAMER - see from_rtsp() for ready-made hardware decode pipelines.
         use_threading {bool} -- If True, uses background thread to pre-caches frames in memory for speed.
                                 If False, uses standard VideoCapture to grab frames on the fly. (Default {True})
         precache_frames {bool} -- Load all video frames into memory during object initialization to increase speed of other operations.
@@ -31,60 +161,128 @@ class VideoLoader():
                                       Leaving this as None means no transform is applied to output. (Default {None})
         width {int} -- Override the default OpenCV capture dimensions - sometimes OpenCV gets incorrect webcam dimensions. (Default {None})
         height {int} -- Override the default OpenCV capture dimensions - sometimes OpenCV gets incorrect webcam dimensions. (Default {None})
+        hw_accel {str or cv2 enum} -- Hardware accelerated decode type: 'any', 'd3d11', 'vaapi', 'mfx' or 'none' (or a cv2.VIDEO_ACCELERATION_* enum).
+                                      'any' lets OpenCV pick a hardware decoder (NVDEC/VAAPI/etc) and silently falls back to software decode if none exists.
+                                      Only used for video files / streams on OpenCV >= 4.5.2, other configurations use the standard software capture. (Default {'any'})
+        use_cudacodec {bool} -- Decode with cv2.cudacodec.VideoReader on CUDA-enabled OpenCV builds. Frames are returned as
+                                cv2.cuda_GpuMat objects that stay in GPU memory (call .download() to get a numpy array),
+                                which skips the ~6 MB/frame GPU->CPU copy at 1080p. Indexing ([] operator) still uses the
+                                software capture since cudacodec has no random access. (Default {False})
+        use_buffer_pool {bool} -- Decode into a pool of max_queue_size preallocated frame buffers instead of allocating a
+                                  new ~6 MB array per frame (at 1080p), so the background thread does zero per-frame heap
+                                  allocation. Buffers are recycled: do NOT retain a yielded frame past the next iteration
+                                  of the loop - call frame.copy() if you need to keep one. Requires use_threading and is
+                                  ignored with use_cudacodec or precache_frames. (Default {False})
+        opencv_num_threads {int} -- If set, calls cv2.setNumThreads() with this value. Setting this to 1 stops OpenCV's
+                                    internal FFmpeg thread pool from contending with the background decode thread.
+                                    Note this is process-global and affects all OpenCV usage. (Default {None})
+        batch_size {int} -- Number of frames the background thread groups into each queue handoff, dividing the queue
+                            synchronization cost per frame by this factor. Partial batches are flushed whenever the
+                            consumer is waiting (and at end of video), so live streams see no added latency.
+                            Used only when use_threading = True. (Default {8})
+        backend {str} -- 'opencv' reads frames through cv2.VideoCapture. 'ffmpeg' spawns an ffmpeg subprocess decoding
+                         raw BGR24 to a pipe and reads frames straight off it, skipping cv2.VideoCapture's per-frame
+                         Python overhead (ffmpeg must be on the PATH). Frames from the ffmpeg backend are read-only
+                         views over the pipe buffer - call frame.copy() to get a writable array. Indexing/slicing still
+                         seeks through the OpenCV capture. Only for video files / stream URLs. (Default {'opencv'})
+        use_umat {bool} -- Hand frames to image_transform as cv2.UMat objects, so OpenCV's T-API dispatches cv2.cvtColor /
+                           cv2.resize / cv2.warpAffine etc. to OpenCL (iGPU) instead of scalar CPU code. The transform's
+                           result is returned as-is - call .get() on a returned UMat to download it to numpy. Ignored when
+                           there is no image_transform or with use_cudacodec (chain cv2.cuda.cvtColor / cv2.cuda.resize on
+                           the GpuMat directly there instead). (Default {False})
+        producer_cpu {int} -- Pin the background decode thread to this CPU core. On NUMA or hybrid (P-core/E-core)
+                              machines the scheduler migrating the decoder between cores thrashes its caches; pinning
+                              producer and consumer to neighboring cores keeps decoded frames cache-hot. Linux only
+                              (ignored elsewhere), used only when use_threading = True. (Default {None})
+        consumer_cpu {int} -- Pin the thread that starts iteration (usually the main thread) to this CPU core.
+                              Linux only (ignored elsewhere), used only when use_threading = True. (Default {None})
+        use_shared_memory {bool} -- Back the frame buffer pool with multiprocessing.shared_memory, so frames can be
+                                    handed to other processes by slot index (see iter_frame_handles()) instead of being
+                                    pickled at ~6 MB per 1080p frame. Workers attach with
+                                    shared_memory.SharedMemory(name = loader.shared_memory_name) and view it as a numpy
+                                    array. Implies use_buffer_pool, with the same retention rules. (Default {False})
         '''
-        self.cap = cv2.VideoCapture(video_path)
+        if opencv_num_threads is not None:
+            cv2.setNumThreads(opencv_num_threads)
+
+        self.cap = self.open_capture(video_path, hw_accel)
         self.video_path = video_path
+
+        self.use_cudacodec = use_cudacodec and hasattr(cv2, 'cudacodec')
+        if use_cudacodec and not self.use_cudacodec:
+            print('WARNING: use_cudacodec requested but this OpenCV build has no cudacodec module. Using the software capture instead.')
+        if self.use_cudacodec:
+            self.reader = cv2.cudacodec.createVideoReader(video_path)
         self.image_transform = image_transform
         self.return_slices_as_iterator = return_slices_as_iterator
-
-        '''video properties - for more see: https://docs.opencv.org/2.4/modules/highgui/doc/reading_and_writing_images_and_video.html
-            Note the constants names changed between OpenCV versions. Versions >= 3 don't have the "CV_" at the beginning.
-        '''
-        if cv2.__version__[0] >= '3':
-            #for OpenCV versions >= 3, they have the constant names without the "CV_" at the beginning
-            self.fps = self.cap.get(cv2.CAP_PROP_FPS)
-            self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            self.video_codec = int(self.cap.get(cv2.CAP_PROP_FOURCC))
-
-            if height is None:
-                self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            else:
-                self.height = height
-                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
-
-            if width is None:
-                self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            else:
-                self.width = width
-                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
-
-            self.pos_frames_number = cv2.CAP_PROP_POS_FRAMES
-        else:
-            #for OpenCV versions < 2, they have the constant names with an the "CV_" at the beginning
-            self.fps = self.cap.get(cv2.CV_CAP_PROP_FPS)
-            self.frame_count = int(self.cap.get(cv2.CV_CAP_PROP_FRAME_COUNT))
-            self.video_codec = int(self.cap.get(cv2.CV_CAP_PROP_FOURCC))
-
-            if height is None:
-                self.height = int(self.cap.get(cv2.CV_CAP_PROP_FRAME_HEIGHT))
-            else:
-                self.height = height
-                self.cap.set(cv2.CV_CAP_PROP_FRAME_HEIGHT, height)
-
-            if width is None:
-                self.width = int(self.cap.get(cv2.CV_CAP_PROP_FRAME_WIDTH))
-            else:
-                self.width = width
-                self.cap.set(cv2.CV_CAP_PROP_FRAME_WIDTH, width)
-
-            self.pos_frames_number = cv2.CV_CAP_PROP_POS_FRAMES
+        self.last_read_position = 0 #next frame the capture will decode, or None when unknown - lets __getitem__ skip redundant seeks
+        self.capture_dirty = False #set when __getitem__ moves the capture, so the next full iteration seeks back to frame 0
+        self.use_umat = use_umat
+        self.next_generator = None #cached __iter__() generator backing the next() protocol
+
+        #video properties - for more see: https://docs.opencv.org/4.x/d4/d15/group__videoio__flags__base.html
+        #read in a single loop over _CAP_PROPS to keep the Python -> C transitions during construction to a minimum
+        for name, prop, cast in _CAP_PROPS:
+            setattr(self, name, cast(self.cap.get(prop)))
+
+        #dimension overrides - sometimes OpenCV gets incorrect webcam dimensions
+        if height is not None:
+            self.height = height
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+
+        if width is not None:
+            self.width = width
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+
+        self.pos_frames_number = _CAP_PROP_POS_FRAMES
+        self.cap_set = self.cap.set #bound-method cache, skips two attribute lookups per __getitem__ call
+
+        #handle the decode backend - the OpenCV capture stays open either way, for properties and seeking
+        self.backend = backend
+        self.hw_accel = hw_accel #kept so the ffmpeg subprocess can be respawned for seeks / re-iteration
+        self.decode_position = 0 #frames decoded so far by the sequential readers (ffmpeg pipe, cudacodec), see seek_to_frame()
+        if self.backend == 'ffmpeg' and (self.use_cudacodec or not isinstance(video_path, str)):
+            print('WARNING: the ffmpeg backend only supports video files / stream URLs and is not compatible with use_cudacodec. Using the opencv backend instead.')
+            self.backend = 'opencv'
+        if self.backend == 'ffmpeg':
+            self.frame_nbytes = self.height * self.width * 3
+            self.proc = self.open_ffmpeg_process(video_path, hw_accel)
 
         #handle threading
         self.use_threading = use_threading
         if self.use_threading:
             self.thread_started = False
-            self.frame_queue = queue.Queue(maxsize = max_queue_size)
+            self.shutdown_event = threading.Event() #signals the background thread to exit immediately
+            self.batch_size = max(1, min(batch_size, max_queue_size))
+            #the queue carries batches, so size it in batches to keep the documented max_queue_size a
+            #frame count - max_queue_size = 20 must not silently become 20 batches of 8 frames
+            self.frame_queue = _SPSCRingBuffer(max(1, max_queue_size // self.batch_size))
             self.first_queue_full_warning_displayed = False
+            self.producer_cpu = producer_cpu
+            self.consumer_cpu = consumer_cpu
+
+        use_buffer_pool = use_buffer_pool or use_shared_memory #the shared memory mode is the buffer pool, placed in a shareable segment
+        self.use_buffer_pool = use_buffer_pool and self.use_threading and not self.use_cudacodec and not precache_frames
+        if use_buffer_pool and not self.use_buffer_pool:
+            print('WARNING: use_buffer_pool requires use_threading and is not supported with use_cudacodec or precache_frames. Allocating frames per read instead.')
+        self.use_shared_memory = use_shared_memory and self.use_buffer_pool
+        if self.use_buffer_pool:
+            #cap.read() writes into these buffers in place, so indices travel through the frame queue
+            #instead of freshly allocated arrays. Consumed slots are handed back via free_slots.
+            if self.use_shared_memory:
+                frame_nbytes = self.height * self.width * 3
+                self.shm = shared_memory.SharedMemory(create = True, size = frame_nbytes * max_queue_size)
+                self.shared_memory_name = self.shm.name #other processes attach with SharedMemory(name = ...)
+                self.frame_pool = [np.ndarray((self.height, self.width, 3), dtype = np.uint8,
+                                        buffer = self.shm.buf, offset = slot * frame_nbytes) for slot in range(max_queue_size)]
+            else:
+                self.frame_pool = [np.empty((self.height, self.width, 3), dtype = np.uint8) for _ in range(max_queue_size)]
+            if self.backend == 'ffmpeg':
+                #flat byte views so the ffmpeg pipe can be read straight into the pooled buffers
+                self.frame_pool_views = [memoryview(buf).cast('B') for buf in self.frame_pool]
+            self.free_slots = _SPSCRingBuffer(max_queue_size)
+            for slot in range(max_queue_size):
+                self.free_slots.put(slot)
 
         self.precache_frames = False
         if precache_frames:
@@ -95,6 +293,127 @@ class VideoLoader():
             self.frame_cache = list(self.__iter__())
             self.precache_frames = True #important that this be AFTER self.frame_cache is generated by __iter__()
 
+    def open_capture(self, video_path, hw_accel):
+        '''Helper function for __init__()
+
+        Opens the underlying VideoCapture. GStreamer pipeline strings go straight to the GStreamer
+        backend (decode then happens inside the GStreamer graph, hardware accelerated if the pipeline
+        says so). For video files / streams on OpenCV >= 4.5.2 this requests hardware accelerated
+        decoding (NVDEC/VAAPI/D3D11/MFX), which moves the entropy decode and colorspace conversion
+        off the CPU. Falls back to the plain software capture everywhere else.'''
+        if isinstance(video_path, str) and (video_path.startswith('gst:') or '!' in video_path):
+            pipeline = video_path[len('gst:'):] if video_path.startswith('gst:') else video_path
+            return cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+
+        if hw_accel is not None and hw_accel != 'none' and isinstance(video_path, str):
+            if hasattr(cv2, 'CAP_PROP_HW_ACCELERATION'):
+                if isinstance(hw_accel, str):
+                    hw_accel = getattr(cv2, HW_ACCELERATION_TYPES.get(hw_accel.lower(), 'VIDEO_ACCELERATION_ANY'))
+
+                try:
+                    cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG,
+                                            [cv2.CAP_PROP_HW_ACCELERATION, hw_accel, cv2.CAP_PROP_HW_DEVICE, 0])
+                    if cap.isOpened():
+                        return cap
+                except cv2.error:
+                    pass #fall through to the software capture below
+            else:
+                #older OpenCV builds have no hardware acceleration API - ask FFmpeg for a hardware decoder directly
+                os.environ.setdefault('OPENCV_FFMPEG_CAPTURE_OPTIONS', 'video_codec;h264_cuvid')
+
+        return cv2.VideoCapture(video_path)
+
+    def open_ffmpeg_process(self, video_path, hw_accel, start_frame = 0):
+        '''Helper function for __init__() and restart_ffmpeg_process()
+
+        Spawns an ffmpeg subprocess that decodes the video to raw BGR24 frames on stdout, which
+        read_frame()/update_thread() then slice into numpy arrays without going through
+        cv2.VideoCapture at all. ffmpeg picks a hardware decoder itself when hw_accel is enabled.
+        start_frame positions the decode via -ss (requires a known fps).'''
+        command = ['ffmpeg', '-nostdin', '-loglevel', 'error']
+        if hw_accel is not None and hw_accel != 'none':
+            command += ['-hwaccel', 'auto'] #NVDEC/VAAPI/etc if available, software decode otherwise
+        if start_frame > 0 and self.fps > 0:
+            command += ['-ss', str(start_frame / self.fps)]
+        command += ['-i', video_path, '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-']
+        self.decode_position = start_frame
+        return subprocess.Popen(command, stdout = subprocess.PIPE, bufsize = self.frame_nbytes * 4)
+
+    def restart_ffmpeg_process(self, start_frame = 0):
+        '''Helper function for seek_to_frame(). The raw video pipe is strictly sequential, so seeking
+        means killing the subprocess and respawning it positioned at the target frame.'''
+        self.proc.stdout.close()
+        self.proc.terminate()
+        self.proc = self.open_ffmpeg_process(self.video_path, self.hw_accel, start_frame = start_frame)
+
+        if start_frame > 0 and self.fps <= 0:
+            #no reliable fps to convert the frame number to a -ss timestamp - decode forward and discard
+            for _ in range(start_frame):
+                if len(self.proc.stdout.read(self.frame_nbytes)) < self.frame_nbytes:
+                    break
+            self.decode_position = start_frame
+
+    def seek_to_frame(self, frame_number):
+        '''Position the loader so the next sequential read returns frame_number. Seeks the OpenCV
+        capture; the sequential readers (ffmpeg pipe, cudacodec) cannot seek, so they are respawned
+        positioned at the target frame when they aren't already there.'''
+        self.cap.set(self.pos_frames_number, frame_number)
+        if self.backend == 'ffmpeg' and self.decode_position != frame_number:
+            self.restart_ffmpeg_process(frame_number)
+        elif self.use_cudacodec and self.decode_position != frame_number:
+            #cudacodec has no random access - recreate the reader and decode forward to the target frame
+            self.reader = cv2.cudacodec.createVideoReader(self.video_path)
+            for _ in range(frame_number):
+                if not self.reader.nextFrame()[0]:
+                    break
+            self.decode_position = frame_number
+        self.last_read_position = frame_number
+        self.capture_dirty = False #position was set deliberately - iteration reads from here, see __iter__()
+
+    @classmethod
+    def from_rtsp(cls, url, decoder = 'nvv4l2decoder', latency = 0, drop_frames = True, **kwargs):
+        ''' Factory for RTSP streams via a hardware accelerated GStreamer pipeline. The whole
+        depay -> decode -> convert chain runs inside the GStreamer graph (NVDEC/V4L2 hardware decode,
+        zero-copy transfers between elements), so the FFmpeg software decoder never touches the stream.
+
+        url {str} -- The rtsp:// stream url.
+        decoder {str} -- GStreamer decoder element: 'nvv4l2decoder' (Jetson), 'nvh264dec' (desktop NVIDIA),
+                         'vaapih264dec' (Intel/AMD VAAPI) or 'avdec_h264' (software). (Default {'nvv4l2decoder'})
+        latency {int} -- rtspsrc jitter buffer in milliseconds. (Default {0})
+        drop_frames {bool} -- Use 'appsink max-buffers=1 drop=true' so only the newest frame is kept - the low
+                              latency mode for live streams, making the Python-side queue largely redundant.
+                              Set False to get every frame with back-pressure on the stream. (Default {True})
+        **kwargs -- Forwarded to VideoLoader().
+        '''
+        if decoder == 'nvv4l2decoder':
+            #only the Jetson decoder outputs NVMM buffers, which need nvvidconv (a Jetson-only element)
+            #to reach system memory. Desktop nvh264dec outputs regular video/x-raw.
+            convert = 'nvvidconv ! video/x-raw,format=BGRx ! videoconvert'
+        else:
+            convert = 'videoconvert'
+
+        sink = 'appsink max-buffers=1 drop=true' if drop_frames else 'appsink'
+        pipeline = (f'rtspsrc location={url} latency={latency} ! rtph264depay ! h264parse ! '
+                    f'{decoder} ! {convert} ! video/x-raw,format=BGR ! {sink}')
+        return cls(pipeline, **kwargs)
+
+    def read_frame(self):
+        '''Read the next frame from the underlying reader. Returns (ret, frame) just like cap.read().
+        On the cudacodec path the frame is a cv2.cuda_GpuMat that stays in GPU memory.
+        On the ffmpeg backend the frame is a read-only view over the pipe buffer.'''
+        if self.use_cudacodec:
+            ret, frame = self.reader.nextFrame()
+            if ret:
+                self.decode_position += 1
+            return (ret, frame) if ret else (ret, None) #normalize end-of-video to None, matching cap.read()
+        if self.backend == 'ffmpeg':
+            raw = self.proc.stdout.read(self.frame_nbytes)
+            if len(raw) < self.frame_nbytes:
+                return False, None #pipe drained - end of video (or ffmpeg exited)
+            self.decode_position += 1
+            return True, np.frombuffer(raw, np.uint8).reshape(self.height, self.width, 3)
+        return self.cap.read()
+
     def __getitem__(self,idx):
         ''' Magic Function so you can use the [] operator to index into this object
         Used only when the frames are stored ie. webcam not supported for this function.
@@ -110,15 +429,21 @@ class VideoLoader():
                 return self.get_series_of_frames_iterator(start_frame = idx.start, end_frame = idx.stop, step = abs(step))
             else:
                 frame_list = self.get_series_of_frames(start_frame = idx.start, end_frame = idx.stop, step = abs(step))
-                return frame_list if idx.step>0 else frame_list[::-1]
+                return frame_list if step > 0 else frame_list[::-1] #step, not idx.step - the latter is None for vid[a:b]
         else:
-            if self.frame_count > idx >= -self.frame_count and isinstance(idx,int):
-                cur_frame_pos = self.get_frame_position() #save current frame position so this method doesn't interfere with __iter__() or __next__()
+            if isinstance(idx, int) and self.frame_count > idx >= -self.frame_count:
+                if idx < 0:
+                    idx += self.frame_count #cheaper than a modulo, and idx is already range-checked
 
-                self.cap.set(self.pos_frames_number, idx%self.frame_count)
-                ret,frame=self.cap.read()
+                #sequential access (vid[i], vid[i+1], ...) keeps the capture positioned forward, so no seek
+                #happens at all. FFmpeg satisfies a seek by jumping to the previous keyframe and decoding
+                #forward, and the old save/seek/restore logic paid that keyframe traversal twice per call.
+                if idx != self.last_read_position:
+                    self.cap_set(self.pos_frames_number, idx)
 
-                self.cap.set(self.pos_frames_number, cur_frame_pos) #reset current frame position so this method doesn't interfere with __iter__() or __next__()
+                ret,frame=self.cap.read()
+                self.last_read_position = idx + 1
+                self.capture_dirty = True #the capture is now at idx + 1, not where a full iteration expects to start
 
                 return self.apply_transform(frame)
             else:
@@ -129,62 +454,96 @@ class VideoLoader():
     def __iter__(self):
         '''Magic Function so you can call this as an iterator. Ex: for frame in VideoLoader('myvideo.mp4')'''
         if self.precache_frames:
-            return self.frame_cache
+            return iter(self.frame_cache)
+
+        if self.capture_dirty:
+            self.seek_to_frame(0) #an earlier __getitem__ moved the capture - a full iteration starts at frame 0
 
         if self.use_threading:
             if not self.thread_started:
                 self.start_thread()
-            while self.thread_started:
-                frame = self.frame_queue.get(block = True, timeout = 30) #timeout is in seconds
-                if frame is None:
+            #loop until the None sentinel, NOT on thread_started - the producer clears that flag as soon
+            #as decoding finishes, while the tail of the video is still sitting in the queue
+            while True:
+                batch = self.frame_queue.get(block = True, timeout = 30) #timeout is in seconds
+                if batch is None:
                     break
-                else:
-                    yield self.apply_transform(frame)
+                for item in batch:
+                    if self.use_buffer_pool:
+                        yield self.apply_transform(self.frame_pool[item])
+                        self.free_slots.put(item) #caller has moved on to the next frame - buffer is reusable
+                    else:
+                        yield self.apply_transform(item)
             self.stop_thread()
         else:
-            ret = True
+            self.last_read_position = None #iteration advances the capture - force interleaved __getitem__ calls to seek
+
+            #local aliases skip the per-frame attribute lookups, and the transform call is skipped
+            #entirely when there is no transform - measurable when decode itself is cheap (small frames)
+            read_frame = self.read_frame
+            apply_transform = self.apply_transform if self.image_transform is not None else None
+
+            ret, frame = read_frame()
             while ret:
-                ret,frame=self.cap.read()
-                yield self.apply_transform(frame)
-        self.cap.set(self.pos_frames_number, 0) #reset frame position to 0, in case __iter__() is called multiple times sequentially
+                yield apply_transform(frame) if apply_transform is not None else frame
+                ret, frame = read_frame()
+        self.seek_to_frame(0) #reset frame position to 0 (respawning the ffmpeg pipe if needed), in case __iter__() is called multiple times sequentially
+
+    def iter_frame_handles(self):
+        ''' Iterate the video as FrameHandle objects instead of raw frames. Buffer pool mode only.
+
+        Unlike plain iteration (which recycles each pooled buffer as soon as the loop advances), a
+        handle keeps ownership of its slot until handle.release() is called or its context manager
+        exits. With use_shared_memory = True this makes multi-process pipelines cheap: send
+        handle.slot to a worker process that has mapped the pool via shared_memory_name, then
+        release the handle when the worker reports back - the only cross-process payload is the
+        integer slot index, no pickling, no copy. Note image_transform is NOT applied, since the
+        whole point is handing over the pooled buffer itself.
+        '''
+        assert self.use_buffer_pool, 'iter_frame_handles() requires use_buffer_pool = True (or use_shared_memory = True)'
+
+        if self.capture_dirty:
+            self.seek_to_frame(0) #an earlier __getitem__ moved the capture - a full iteration starts at frame 0
+        if not self.thread_started:
+            self.start_thread()
+        #loop until the None sentinel, NOT on thread_started - the producer clears that flag as soon
+        #as decoding finishes, while the tail of the video is still sitting in the queue
+        while True:
+            batch = self.frame_queue.get(block = True, timeout = 30) #timeout is in seconds
+            if batch is None:
+                break
+            for slot in batch:
+                yield FrameHandle(self.frame_pool[slot], slot, self.free_slots)
+        self.stop_thread()
+        self.seek_to_frame(0) #reset frame position to 0 like __iter__(), so later iteration starts from the beginning
 
     def __next__(self):
-        '''Magic Function so you use the next() function on this object.'''
-        if self.use_threading:
-            if not self.thread_started:
-                self.start_thread()
-            frame = self.frame_queue.get(block = True, timeout = 30) #timeout is in seconds
-            if frame is None:
-                raise StopIteration
-            else:
-                yield self.apply_transform(frame)
-        else:
-            ret,frame=self.cap.read()        
-            if ret >= self.frame_count:
-                self.cap.set(self.pos_frames_number, 0)
-                raise StopIteration
-            else:
-                return self.apply_transform(frame)
+        '''Magic Function so you use the next() function on this object.
+        Delegates to a single cached __iter__() generator: the old implementation used yield here, which
+        made every next() call build (and discard) a brand new generator object instead of returning a
+        frame - both breaking the iterator protocol and paying a generator allocation per frame. Going
+        through __iter__() also reuses the threaded path's batching and shutdown logic.
+        '''
+        if self.next_generator is None:
+            self.next_generator = self.__iter__()
+        try:
+            return next(self.next_generator)
+        except StopIteration:
+            self.next_generator = None #the next next() call starts over from the beginning of the video
+            raise
 
     def __repr__(self):
-        '''Magic Function so you can use the print() function on this object.
-        Using inspect to fix the triple commented string issue per this. Textwrap module didn't work due to leading line issue.
-        https://stackoverflow.com/questions/1412374/how-to-remove-extra-indentation-of-python-triple-quoted-multi-line-strings/47417848#47417848
-        '''
-        ret = f'''-------------VideoLoader Object-------------
-                    Video Source: {self.video_path}
-                    Threaded: {self.use_threading}
-                    Image Transform: {"Yes" if self.image_transform else "No"}
-                    Height: {self.height}
-                    Width: {self.width}
-                    Length: {self.frame_count}
-                    FPS: {self.fps}
-                    Video Codec: {self.video_codec}
-                    Precached frames: {self.precache_frames}
-                    Slicing Returns Iterator (Default=List): {self.return_slices_as_iterator}
-                    --------------------------------------------
-                    '''
-        return inspect.cleandoc(ret)
+        '''Magic Function so you can use the print() function on this object.'''
+        return self._REPR_TEMPLATE.format(video_path = self.video_path,
+                                          use_threading = self.use_threading,
+                                          image_transform = 'Yes' if self.image_transform else 'No',
+                                          height = self.height,
+                                          width = self.width,
+                                          frame_count = self.frame_count,
+                                          fps = self.fps,
+                                          video_codec = self.video_codec,
+                                          precache_frames = self.precache_frames,
+                                          return_slices_as_iterator = self.return_slices_as_iterator)
 
     def __len__(self):
         '''Magic Function so you can use the len() function on this object.'''
@@ -197,6 +556,16 @@ class VideoLoader():
         #print('Releasing resources.')
         if self.use_threading:
             self.stop_thread()
+        if getattr(self, 'proc', None) is not None:
+            self.proc.stdout.close()
+            self.proc.terminate()
+            self.proc = None
+        if getattr(self, 'shm', None) is not None:
+            self.frame_pool = None #drop the numpy views into the segment before closing it
+            self.frame_pool_views = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
         self.cap.release()
 
     def __del__(self):
@@ -223,8 +592,9 @@ class VideoLoader():
 
         if self.frame_count > end_frame >= start_frame >= 0:
             cur_frame_pos = self.get_frame_position() #save current frame position so this method doesn't interfere with __iter__() or __next__()
+            capture_dirty = self.capture_dirty #restored below along with the position, since seek_to_frame() clears it
             frame_list = []
-            self.cap.set(self.pos_frames_number, start_frame)
+            self.seek_to_frame(start_frame)
             #reading all the frames is faster than seeking according to this:
             #https://stackoverflow.com/questions/52655841/opencv-python-multithreading-seeking-within-a-videocapture-object
             for idx, frame in enumerate(self.__iter__()):
@@ -232,10 +602,13 @@ class VideoLoader():
                     break
                 if idx % step == 0:
                     frame = self.apply_transform(frame)
+                    if self.use_buffer_pool and frame is not None:
+                        frame = np.copy(frame) #pooled buffers are recycled as iteration advances - the returned list must own its frames
                     frame_list.append(frame)
 
             self.stop_thread() #to prevent error "Assertion fctx->async_lock failed at libavcodec/pthread_frame.c:155"           
-            self.cap.set(self.pos_frames_number, cur_frame_pos) #reset current frame position so this method doesn't interfere with __iter__() or __next__()
+            self.seek_to_frame(int(cur_frame_pos)) #reset current frame position so this method doesn't interfere with __iter__() or __next__()
+            self.capture_dirty = capture_dirty
             return frame_list
         else:
             raise IndexError(
@@ -260,8 +633,9 @@ class VideoLoader():
 
         if self.frame_count > end_frame >= start_frame >= 0:
             cur_frame_pos = self.get_frame_position() #save current frame position so this method doesn't interfere with __iter__() or __next__()
+            capture_dirty = self.capture_dirty #restored below along with the position, since seek_to_frame() clears it
 
-            self.cap.set(self.pos_frames_number, start_frame)
+            self.seek_to_frame(start_frame)
             #reading all the frames is faster than seeking according to 
             #https://stackoverflow.com/questions/52655841/opencv-python-multithreading-seeking-within-a-videocapture-object
             for idx, frame in enumerate(self.__iter__()):
@@ -271,17 +645,104 @@ class VideoLoader():
                     yield frame                
 
             self.stop_thread() #to prevent error "Assertion fctx->async_lock failed at libavcodec/pthread_frame.c:155"
-            self.cap.set(self.pos_frames_number, cur_frame_pos) #reset current frame position so this method doesn't interfere with __iter__() or __next__()
+            self.seek_to_frame(int(cur_frame_pos)) #reset current frame position so this method doesn't interfere with __iter__() or __next__()
+            self.capture_dirty = capture_dirty
         else:
             raise IndexError(
                 f'''Inputs must satisfy frame_count > end_frame >= start_frame >= 0. Start Frame = {start_frame}. End frames = {end_frame}. Frame count = {self.frame_count}.''')
 
     def set(self, var1, var2):
-        self.cap.set(var1, var2)           
+        self.cap.set(var1, var2)
+        self.last_read_position = None #capture position may have changed - force the next __getitem__ to seek           
 
     def get_frame_position(self):
+        if self.backend == 'ffmpeg' or self.use_cudacodec:
+            return self.decode_position #frames come off the pipe / cudacodec reader, not the OpenCV capture
         return self.cap.get(self.pos_frames_number)
 
+    def resolve_output_video_codec(self, output_video_codec):
+        '''Helper function for save_video_to_file() and process_video().
+
+        Converts a codec string into a cv2 fourcc codec. Defaults to the input video's codec,
+        or mp4v when the input is a webcam / stream.'''
+        if output_video_codec is None:
+            output_video_codec = self.video_codec if self.frame_count > 0 else 'mp4v' #use same video codec if video file, for webcam defualt to mp4v
+
+        if isinstance(output_video_codec,str):
+            if output_video_codec == 'mp4': #just in case someone puts in mp4 intending mp4v
+                output_video_codec = 'mp4v'
+
+            output_video_codec = cv2.VideoWriter_fourcc(*output_video_codec)
+
+        return output_video_codec
+
+    def process_video(self, callback, output_path, output_video_codec = None, fps = None, prefetch = 8):
+        ''' Run a three stage decode -> compute -> encode pipeline over the video.
+        A reader thread decodes frames ahead into a bounded queue, callback runs on the main thread
+        (so stateful trackers etc. need no locking), and a writer thread encodes the results. The three
+        stages run concurrently, so wall time is roughly max(decode, compute, encode) instead of their sum.
+
+        callback {function} -- Called as callback(frame, frame_idx) on the main thread. Must return the frame to write.
+        output_path {str} -- Filepath of the output video (ex. path/to/video.mp4).
+        output_video_codec {cv2 VideoCodec Object or Str} -- Same behavior as save_video_to_file(). (Default {None})
+        fps {int/float} -- Output video frames per second. Default is same FPS as the input video, or 24 if not detected.
+        prefetch {int} -- Size bound of the read and write queues, ie. how many frames each stage may run ahead. (Default {8})
+        '''
+        output_video_codec = self.resolve_output_video_codec(output_video_codec)
+
+        if fps is None:
+            fps = self.fps
+
+        if fps <= 0:
+            print(f'WARNING: FPS {fps} < 0, using FPS = 24 instead')
+            fps = 24
+
+        read_queue = _SPSCRingBuffer(prefetch)
+        write_queue = _SPSCRingBuffer(prefetch)
+
+        def reader():
+            ret, frame = self.read_frame()
+            while ret:
+                read_queue.put(frame, block = True, timeout = 30) #timeout is in seconds
+                ret, frame = self.read_frame()
+            read_queue.put(None) #end-of-video sentinel
+
+        def writer():
+            vid_writer = None
+            while True:
+                frame = write_queue.get(block = True, timeout = 30) #timeout is in seconds
+                if frame is None:
+                    break
+                if vid_writer is None:
+                    #size the writer off the first processed frame, since callback may resize/crop
+                    frame_height, frame_width = frame.shape[:2]
+                    vid_writer = cv2.VideoWriter(output_path, output_video_codec, fps, (frame_width, frame_height))
+                vid_writer.write(frame)
+
+            if vid_writer is not None:
+                vid_writer.release()
+
+        print(f'Creating processed video: {output_path}')
+        reader_thread = threading.Thread(target = reader, daemon = True)
+        writer_thread = threading.Thread(target = writer, daemon = True)
+        reader_thread.start()
+        writer_thread.start()
+
+        idx = 0
+        while True:
+            frame = read_queue.get(block = True, timeout = 30) #timeout is in seconds
+            if frame is None:
+                break
+            write_queue.put(callback(frame, idx), block = True, timeout = 30)
+            idx += 1
+
+        write_queue.put(None) #propagate the sentinel through to the writer
+        reader_thread.join()
+        writer_thread.join()
+        self.seek_to_frame(0) #reset frame position to 0 (respawning the ffmpeg pipe if needed), so later iteration starts from the beginning
+        print('Done.')
+        return idx
+
     def save_video_to_file(self,output_video_path=None,output_video_codec = None, fps = None, start = 0, end = None, step = 1, enable_start_stop_with_keypress = False):
         ''' Apply image_transform to video.
         output_video_path {str} -- Filepath to the output video (ex. path/to/video.mp4). Defaults behavior is as follows:
@@ -304,14 +765,7 @@ class VideoLoader():
         if output_video_path is None:
             output_video_path = self.video_path[:-4] + "_transformed" + self.video_path[-4:]
 
-        if output_video_codec is None:
-            output_video_codec = self.video_codec if self.frame_count > 0 else 'mp4v' #use same video codec if video file, for webcam defualt to mp4v
-
-        if isinstance(output_video_codec,str):
-            if output_video_codec == 'mp4': #just in case someone puts in mp4 intending mp4v
-                output_video_codec = 'mp4v'
-
-            output_video_codec = cv2.VideoWriter_fourcc(*output_video_codec)
+        output_video_codec = self.resolve_output_video_codec(output_video_codec)
 
         if fps is None:
             fps = self.fps
@@ -374,49 +828,201 @@ class VideoLoader():
                 if 0 <= cv2.waitKey(1):
                     break
 
+    @staticmethod
+    def make_preprocess(out_hw, mean, std, dtype = np.float32):
+        ''' Build a fused ML preprocessing transform to pass as image_transform.
+        The usual chain cv2.resize -> BGR to RGB -> astype(float32)/255 -> (x-mean)/std walks the whole
+        frame through DRAM once per step. The returned function does bilinear resize, channel swap,
+        normalization and HWC to CHW transpose in a single memory sweep, compiled with numba across all
+        cores - on memory-bound 1080p frames this cuts the transform's memory traffic roughly 4x.
+
+        out_hw {tuple} -- Output (height, width).
+        mean {sequence} -- Per-channel RGB mean, in 0-1 range (ex. (0.485, 0.456, 0.406)).
+        std {sequence} -- Per-channel RGB std, in 0-1 range (ex. (0.229, 0.224, 0.225)).
+        dtype {np dtype} -- Output dtype. float32 is computed directly, anything else costs one extra cast pass. (Default {np.float32})
+
+        Returns a function mapping a HxWx3 uint8 BGR frame to a 3 x out_h x out_w normalized RGB array.
+        Requires the numba package. The first call per frame size pays a one-time JIT compile cost.
+        '''
+        try:
+            from numba import njit, prange
+        except ImportError:
+            raise ImportError('make_preprocess() requires the numba package. Install it with: pip install numba')
+
+        out_h, out_w = out_hw
+        mean = np.asarray(mean, dtype = np.float32)
+        std = np.asarray(std, dtype = np.float32)
+
+        @njit(parallel = True, fastmath = True, cache = True)
+        def fused_kernel(frame):
+            in_h, in_w = frame.shape[0], frame.shape[1]
+            out = np.empty((3, out_h, out_w), dtype = np.float32)
+            scale_y = in_h / out_h
+            scale_x = in_w / out_w
+
+            for y in prange(out_h):
+                src_y = (y + 0.5) * scale_y - 0.5
+                if src_y < 0:
+                    src_y = 0.0
+                y0 = int(src_y)
+                y1 = y0 + 1 if y0 + 1 < in_h else in_h - 1
+                wy = src_y - y0
+
+                for x in range(out_w):
+                    src_x = (x + 0.5) * scale_x - 0.5
+                    if src_x < 0:
+                        src_x = 0.0
+                    x0 = int(src_x)
+                    x1 = x0 + 1 if x0 + 1 < in_w else in_w - 1
+                    wx = src_x - x0
+
+                    for c in range(3):
+                        #bilinear sample, then write BGR channel c to RGB channel 2-c, normalized, in CHW layout
+                        top = frame[y0, x0, c] * (1.0 - wx) + frame[y0, x1, c] * wx
+                        bottom = frame[y1, x0, c] * (1.0 - wx) + frame[y1, x1, c] * wx
+                        pixel = top * (1.0 - wy) + bottom * wy
+                        out[2 - c, y, x] = (pixel / 255.0 - mean[2 - c]) / std[2 - c]
+
+            return out
+
+        if dtype == np.float32:
+            return fused_kernel
+        return lambda frame: fused_kernel(frame).astype(dtype)
+
     def apply_transform(self,frame):
-        return frame if self.image_transform is None else self.image_transform(frame)
+        if self.image_transform is None:
+            return frame
+        if self.use_umat and frame is not None and not self.use_cudacodec:
+            frame = cv2.UMat(frame) #OpenCV's T-API runs cvtColor/resize/etc on OpenCL from a UMat
+        return self.image_transform(frame)
 
     #----------------------------------THREADING SPECIFIC FUNCTIONS----------------------------------
     def start_thread(self):
         if self.thread_started:
             print('Thread already started!')
             return
-        with self.frame_queue.mutex:
-            self.frame_queue.queue.clear() #clear the queue - in case it already has stuff in it
+        self.frame_queue.clear() #clear the queue - in case it already has stuff in it
+
+        if self.use_buffer_pool:
+            #the cleared queue may have held slot indices - rebuild the free list from scratch so
+            #those buffers aren't stranded (a shrunken pool eventually starves the producer)
+            self.free_slots.clear()
+            for slot in range(len(self.frame_pool)):
+                self.free_slots.put(slot)
+
+        if self.consumer_cpu is not None and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, {self.consumer_cpu}) #0 = the calling (consumer) thread
 
+        self.last_read_position = None #the background thread advances the capture - force __getitem__ to seek
+        self.shutdown_event.clear()
         self.thread_started = True
         self.thread = threading.Thread(target = self.update_thread, daemon = True, args =())
         self.thread.start()
 
+    def get_free_buffer_slot(self):
+        '''Helper function for update_thread(). Blocks until a pooled frame buffer is free,
+        or returns None if the thread is stopped while waiting.'''
+        while not self.shutdown_event.is_set():
+            try:
+                return self.free_slots.get_nowait()
+            except queue.Empty:
+                self.shutdown_event.wait(0.001) #1 ms wait, so shutdown is noticed almost immediately
+        return None
+
+    def put_in_frame_queue(self, item):
+        '''Helper function for update_thread(). Puts a batch (or the None end-of-video sentinel)
+        into the frame queue. Returns True if the item was enqueued, False if it was dropped
+        because the queue stayed full, or None if the thread was stopped while trying.'''
+        try:
+            self.frame_queue.put_nowait(item)
+            return True
+        except queue.Full:
+            #a transiently full queue is the normal steady state when decode outruns the consumer -
+            #retry in 1 ms steps on the shutdown event instead of a blocking 1 second put(). Shutdown
+            #latency drops from up to a second to roughly a millisecond, and the same 1 second grace
+            #period still applies before a batch is dropped on a stalled consumer
+            deadline = time.monotonic() + 1
+            while not self.shutdown_event.is_set():
+                try:
+                    self.frame_queue.put_nowait(item)
+                    return True
+                except queue.Full:
+                    if time.monotonic() >= deadline:
+                        #Current behavior is that if the queue is full and the main process has not exited, then we start dropping frames.
+                        #No warning for the None sentinel - the caller retries it until it lands, nothing is dropped
+                        if item is not None and not self.first_queue_full_warning_displayed:
+                            self.first_queue_full_warning_displayed=True
+                            print('Warning background thread has filled up frame queue storage. Future frames may be dropped if input is a video stream.')
+                        return False #batch dropped - the consumer is not keeping up with the stream
+                    self.shutdown_event.wait(0.001)
+            return None
+
     def update_thread(self):
+        if self.producer_cpu is not None and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, {self.producer_cpu}) #0 = the calling thread, ie. this producer
+
         ret = True
+        batch = []
+        spare_slots = [] #pooled buffers recycled producer-side (failed reads / dropped batches), keeps free_slots strictly SPSC
 
         while ret and self.thread_started:
-            ret, frame = self.cap.read()
-
-            try:
-                self.frame_queue.put(frame,block=True, timeout = 1) #timeout is in seconds, on last read, None is put into the Queue conveniently 
-            except queue.Full:
-                #Current behavior is that if the queue is full and the main process has not exited, then we start dropping frames
-                if not self.thread_started:
+            #the grab()/retrieve() split lets OpenCV release the GIL during the demux/decode in grab(),
+            #overlapping it with whatever the main thread is doing, instead of read() holding it longer
+            if self.use_buffer_pool:
+                slot = spare_slots.pop() if spare_slots else self.get_free_buffer_slot()
+                if slot is None:
                     break
+                if self.backend == 'ffmpeg':
+                    #read the raw frame bytes straight into the pooled buffer, no intermediate copy
+                    ret = self.proc.stdout.readinto(self.frame_pool_views[slot]) == self.frame_nbytes
+                    if ret:
+                        self.decode_position += 1
+                else:
+                    ret = self.cap.grab()
+                    if ret:
+                        ret, out = self.cap.retrieve(self.frame_pool[slot]) #in-place retrieve, no per-frame allocation
+                        if ret and out is not self.frame_pool[slot]:
+                            #OpenCV only fills the passed array when shape/dtype/continuity match - otherwise
+                            #it returns a fresh array (e.g. a webcam ignoring the width/height override).
+                            #Copy it into the pool slot, or stale buffer contents get yielded as a frame
+                            if out.shape == self.frame_pool[slot].shape:
+                                np.copyto(self.frame_pool[slot], out)
+                            else:
+                                print(f'WARNING: decoded frame shape {out.shape} does not fit the preallocated '
+                                      f'{self.frame_pool[slot].shape} pool buffers. Stopping the decode thread - '
+                                      'pass matching width/height or disable use_buffer_pool.')
+                                ret = False #treat as a failed read rather than yield garbage
+                if ret:
+                    batch.append(slot) #indices travel through the queue instead of frames
                 else:
-                    if not self.first_queue_full_warning_displayed:
-                        self.first_queue_full_warning_displayed=True
-                        print('Warning background thread has filled up frame queue storage. Future frames may be dropped if input is a video stream.')
-
-                        #continue attmpting the next frame into the queue until it's read by the main thread or the main thread has stopped
-                        while self.thread_started:
-                            try:
-                                self.frame_queue.put(frame, block=True, timeout = 1)
-                                break
-                            except:
-                                pass
+                    spare_slots.append(slot) #read failed - hand the unused buffer back
+            elif self.use_cudacodec or self.backend == 'ffmpeg':
+                ret, frame = self.read_frame()
+                if ret:
+                    batch.append(frame)
+            else:
+                ret = self.cap.grab()
+                if ret:
+                    batch.append(self.cap.retrieve()[1])
+
+            #flush a full batch immediately, and a partial batch when the consumer is waiting
+            #(keeps live-stream latency low) or at end of video
+            if batch and (len(batch) == self.batch_size or self.frame_queue.empty() or not ret):
+                enqueued = self.put_in_frame_queue(batch)
+                if enqueued is None:
+                    break
+                if not enqueued and self.use_buffer_pool:
+                    spare_slots.extend(batch) #dropped batch - recycle its buffers
+                batch = []
+
+        if not ret:
+            while self.put_in_frame_queue(None) is False:
+                pass #the consumer stops on the end-of-video sentinel, so it must never be dropped
 
         self.thread_started = False
 
     def stop_thread(self):
+        self.shutdown_event.set() #wakes the background thread out of any of its short waits
         self.thread_started = False
         self.thread.join()
 